@@ -10,9 +10,13 @@ Downloaded files are placed in:
     assets/images/radha_krishna.jpg
     assets/music/background.mp3
 
-Both sources are checked against expected magic bytes before saving to disk.
+Both sources are checked against expected magic bytes before saving to disk,
+and against the checksum the source publishes for the file when there is one.
 HTTPS is enforced for all downloads.
 
+The image and audio are fetched concurrently (they live on independent hosts),
+so total download time is roughly the slower of the two rather than their sum.
+
 Pass --synthetic to skip all network downloads and generate placeholder assets
 locally using FFmpeg (useful in CI environments with restricted network access).
 
@@ -22,14 +26,18 @@ Usage:
 """
 
 import argparse
+import contextlib
+import hashlib
+import json
 import os
 import subprocess
 import sys
-import urllib.request
+import threading
 import urllib.parse
-import json
-import shutil
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, TextIO, Tuple
+
+import requests
 
 # ── Output paths ──────────────────────────────────────────────────────────────
 
@@ -38,11 +46,73 @@ MUSIC_DIR   = os.path.join("assets", "music")
 IMAGE_PATH  = os.path.join(IMAGES_DIR, "radha_krishna.jpg")
 AUDIO_PATH  = os.path.join(MUSIC_DIR,  "background.mp3")
 
+# API responses cached with their ETag so warm runs can revalidate with a
+# conditional GET (304 Not Modified) instead of re-downloading and re-parsing.
+CACHE_DIR   = os.path.join("assets", ".cache")
+
 # Bot-policy-compliant User-Agent (required by Wikimedia)
 USER_AGENT  = "DevotionalVideoBot/1.0 (github.com/lohitsuri1/Lohit-Video-Workflow)"
 
-# Network timeouts (seconds)
-TIMEOUT = 30
+# Network timeouts (seconds).  The read timeout applies to every socket read,
+# so a stalled mid-transfer connection fails fast instead of hanging, while a
+# large-but-steady MP3 download is never cut off by an overall deadline.
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT    = 30
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Streaming buffer for downloads (1 MiB): a multi-MB MP3 is copied in a few
+# large reads/writes instead of hundreds of 16 KiB ones.
+_CHUNK_SIZE = 1 << 20
+
+# One keep-alive session per worker thread: requests to the same host (the
+# archive.org metadata call and the archive.org/download URL, or a fallback
+# after a failed attempt) reuse a pooled connection instead of paying a fresh
+# TCP + TLS handshake each time.  requests.Session is not documented as
+# thread-safe, so the image and audio workers do not share one; each talks to
+# its own hosts anyway, so nothing is lost.
+#
+# HTTP/2 would not add anything here.  Every remaining request goes to a
+# different host (commons.wikimedia.org for the API, upload.wikimedia.org for
+# the image, an ia*.us.archive.org node after the download redirect), so there
+# is nothing to multiplex over one connection.  Pooled HTTP/1.1 keep-alive
+# covers it without an extra httpx/h2 dependency.
+_sessions = threading.local()
+
+
+def _session() -> requests.Session:
+    """Return the calling thread's keep-alive session, creating it on first use."""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update({"User-Agent": USER_AGENT})
+        _sessions.session = session
+    return session
+
+# ── Progress output ───────────────────────────────────────────────────────────
+
+# The image and audio workers run concurrently.  Their messages are collected
+# per worker and printed as one block when it finishes, so the two progress
+# logs never interleave.
+_worker = threading.local()
+
+
+def _say(*args, file: Optional[TextIO] = None) -> None:
+    """print() for progress messages; buffered while running inside a worker."""
+    log = getattr(_worker, "log", None)
+    if log is None:
+        print(*args, file=file)
+    else:
+        log.append((file, " ".join(str(a) for a in args)))
+
+
+def _run_worker(fn: Callable[[], bool]) -> Tuple[bool, List[Tuple[Optional[TextIO], str]]]:
+    """Run *fn* with its _say() output buffered; return (result, messages)."""
+    _worker.log = []
+    try:
+        return fn(), _worker.log
+    finally:
+        del _worker.log
+
 
 # ── Security helpers ──────────────────────────────────────────────────────────
 
@@ -52,15 +122,27 @@ def _https_only(url: str) -> None:
         raise ValueError(f"[Security] Refusing non-HTTPS URL: {url}")
 
 
-def _validate_magic(path: str, expected: str) -> None:
+@contextlib.contextmanager
+def _atomic_write(dest: str) -> Iterator[str]:
     """
-    Check the file's magic bytes.
-    *expected* is 'image' (JPEG/PNG) or 'audio' (MP3/OGG).
-    Deletes the file and raises ValueError on mismatch.
+    Yield a temporary path next to *dest*.  It is moved onto *dest* when the
+    block succeeds and removed if the block raises, so *dest* is never partial.
     """
-    with open(path, "rb") as fh:
-        header = fh.read(12)
+    tmp = dest + ".tmp"
+    try:
+        yield tmp
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
 
+def _validate_magic(header: bytes, expected: str, name: str) -> None:
+    """
+    Check the leading magic bytes of a download.
+    *expected* is 'image' (JPEG/PNG) or 'audio' (MP3/OGG).
+    Raises ValueError on mismatch.
+    """
     is_jpeg = header[:2] == b"\xff\xd8"
     is_png  = header[:4] == b"\x89PNG"
     is_mp3  = header[:3] == b"ID3" or (len(header) >= 2 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0)
@@ -68,34 +150,113 @@ def _validate_magic(path: str, expected: str) -> None:
 
     valid = (is_jpeg or is_png) if expected == "image" else (is_mp3 or is_ogg)
     if not valid:
-        os.unlink(path)
         raise ValueError(
-            f"[Security] Unexpected file header for {os.path.basename(path)} "
+            f"[Security] Unexpected file header for {name} "
             f"(expected {expected}, got 0x{header[:4].hex()})"
         )
 
 
-def _download(url: str, dest: str, extra_headers: Optional[dict] = None) -> None:
-    """Download *url* to *dest* over HTTPS with redirect following."""
+def _download(
+    url: str,
+    dest: str,
+    expected: str,
+    extra_headers: Optional[dict] = None,
+    checksum: Optional[Tuple[str, str]] = None,
+) -> None:
+    """
+    Download *url* to *dest* over HTTPS with redirect following.
+    The magic bytes are checked against *expected* ('image' or 'audio') on the
+    first streamed chunk, before anything is written, so a wrong file type is
+    rejected without downloading the rest of it.
+    *checksum* is an optional ``(algorithm, hexdigest)`` published by the
+    source; the stream is hashed as it is written and must match it.
+    """
     _https_only(url)
-    headers = {"User-Agent": USER_AGENT}
-    if extra_headers:
-        headers.update(extra_headers)
-
-    req = urllib.request.Request(url, headers=headers)
-    with urllib.request.urlopen(req, timeout=TIMEOUT) as resp, open(dest, "wb") as fh:
-        shutil.copyfileobj(resp, fh)
+    with _session().get(url, headers=extra_headers, stream=True, timeout=TIMEOUT) as resp:
+        resp.raise_for_status()
+        chunks = resp.iter_content(chunk_size=_CHUNK_SIZE)
+        first  = next(chunks, b"")
+        _validate_magic(first[:12], expected, os.path.basename(dest))
+
+        hasher  = hashlib.new(checksum[0]) if checksum else None
+        written = len(first)
+        with open(dest, "wb") as fh:
+            fh.write(first)
+            if hasher:
+                hasher.update(first)
+            for chunk in chunks:
+                fh.write(chunk)
+                written += len(chunk)
+                if hasher:
+                    hasher.update(chunk)
+
+        # A dropped connection can end the stream early without an error;
+        # catch the truncation here rather than saving a partial file.
+        expected_len = resp.headers.get("Content-Length")
+        if expected_len and "Content-Encoding" not in resp.headers and written != int(expected_len):
+            raise ValueError(
+                f"Truncated download from {url} ({written} of {expected_len} bytes)"
+            )
+        if hasher and hasher.hexdigest() != checksum[1].lower():
+            raise ValueError(
+                f"[Security] {checksum[0]} mismatch for {os.path.basename(dest)} "
+                f"(expected {checksum[1]}, got {hasher.hexdigest()})"
+            )
 
 
-def _fetch_json(url: str, extra_headers: Optional[dict] = None) -> dict:
-    """Fetch *url* and return parsed JSON."""
+def _load_cached_json(path: str, url: str) -> Optional[dict]:
+    """
+    Return the cached ``{"url": ..., "etag": ..., "body": ...}`` entry at *path*,
+    or None if there is none or it was stored for a different *url*.
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            entry = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or "etag" not in entry or "body" not in entry:
+        return None
+    if entry.get("url") != url:
+        return None
+    return entry
+
+
+def _fetch_json(
+    url: str,
+    extra_headers: Optional[dict] = None,
+    cache_name: Optional[str] = None,
+) -> dict:
+    """
+    Fetch *url* and return parsed JSON.
+    When *cache_name* is given, the parsed body is cached under CACHE_DIR with
+    the URL and its ETag; later calls for the same URL send If-None-Match and
+    reuse the cache on a 304.
+    """
     _https_only(url)
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+    headers = {"Accept": "application/json"}
     if extra_headers:
         headers.update(extra_headers)
-    req = urllib.request.Request(url, headers=headers)
-    with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-        return json.loads(resp.read().decode())
+
+    cache_path = os.path.join(CACHE_DIR, cache_name) if cache_name else None
+    cached = _load_cached_json(cache_path, url) if cache_path else None
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+
+    resp = _session().get(url, headers=headers, timeout=TIMEOUT)
+    if cached and resp.status_code == 304:
+        return cached["body"]
+    resp.raise_for_status()
+    body = resp.json()
+
+    etag = resp.headers.get("ETag")
+    if cache_path and etag:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with _atomic_write(cache_path) as tmp, open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"url": url, "etag": etag, "body": body}, fh)
+        except OSError:
+            pass  # caching is best-effort
+    return body
 
 # ── Image download ─────────────────────────────────────────────────────────────
 
@@ -109,37 +270,34 @@ def download_image(dest: str) -> bool:
     Download a public-domain Radha-Krishna image from Wikimedia Commons.
     Returns True on success, False on failure.
     """
-    print("📷  Downloading image from Wikimedia Commons …")
+    _say("📷  Downloading image from Wikimedia Commons …")
     try:
         encoded_title = urllib.parse.quote(_WIKIMEDIA_TITLE, safe=":/")
         info_url = (
             "https://commons.wikimedia.org/w/api.php"
             f"?action=query&titles={encoded_title}"
-            f"&prop=imageinfo&iiprop=url&iiurlwidth=1920&format=json"
+            f"&prop=imageinfo&iiprop=url|sha1&iiurlwidth=1920&format=json"
         )
-        data   = _fetch_json(info_url)
+        data   = _fetch_json(info_url, cache_name="wikimedia_info.json")
         pages  = data.get("query", {}).get("pages", {})
         page   = next(iter(pages.values()))
-        img_url = (
-            page.get("imageinfo", [{}])[0].get("thumburl")
-            or page.get("imageinfo", [{}])[0].get("url")
-        )
+        info   = page.get("imageinfo", [{}])[0]
+        img_url = info.get("thumburl") or info.get("url")
         if not img_url:
             raise ValueError("No image URL in Wikimedia API response")
 
-        tmp = dest + ".tmp"
-        _download(img_url, tmp)
-        _validate_magic(tmp, "image")
-        os.replace(tmp, dest)
+        # The published SHA-1 covers the original file only, not thumbnails
+        checksum = None
+        if img_url == info.get("url") and info.get("sha1"):
+            checksum = ("sha1", info["sha1"])
+
+        with _atomic_write(dest) as tmp:
+            _download(img_url, tmp, "image", checksum=checksum)
         size_kb = os.path.getsize(dest) / 1024
-        print(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
+        _say(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
         return True
     except Exception as exc:
-        print(f"   ⚠  Wikimedia download failed: {exc}")
-        # Clean up partial files
-        for p in [dest, dest + ".tmp"]:
-            if os.path.exists(p):
-                os.unlink(p)
+        _say(f"   ⚠  Wikimedia download failed: {exc}")
         return False
 
 # ── Audio download ─────────────────────────────────────────────────────────────
@@ -153,10 +311,10 @@ def download_audio(dest: str) -> bool:
     Download a public-domain devotional music track from Internet Archive.
     Returns True on success, False on failure.
     """
-    print("🎵  Downloading audio from Internet Archive …")
+    _say("🎵  Downloading audio from Internet Archive …")
     try:
         files_url = f"https://archive.org/metadata/{_IA_IDENTIFIER}/files"
-        data  = _fetch_json(files_url)
+        data  = _fetch_json(files_url, cache_name="ia_files.json")
         files = data.get("result", [])
 
         # Pick the smallest MP3 (keeps download fast in CI)
@@ -174,19 +332,17 @@ def download_audio(dest: str) -> bool:
             + urllib.parse.quote(audio_file["name"])
         )
         size_mb = int(audio_file.get("size", 0)) / (1024 * 1024)
-        print(f"   ⬇  {audio_file['name']} ({size_mb:.1f} MB)")
+        _say(f"   ⬇  {audio_file['name']} ({size_mb:.1f} MB)")
 
-        tmp = dest + ".tmp"
-        _download(audio_url, tmp)
-        _validate_magic(tmp, "audio")
-        os.replace(tmp, dest)
-        print(f"   ✔  Saved: {dest}")
+        # Internet Archive lists a SHA-1 for every file in the item
+        checksum = ("sha1", audio_file["sha1"]) if audio_file.get("sha1") else None
+
+        with _atomic_write(dest) as tmp:
+            _download(audio_url, tmp, "audio", checksum=checksum)
+        _say(f"   ✔  Saved: {dest}")
         return True
     except Exception as exc:
-        print(f"   ⚠  Internet Archive download failed: {exc}")
-        for p in [dest, dest + ".tmp"]:
-            if os.path.exists(p):
-                os.unlink(p)
+        _say(f"   ⚠  Internet Archive download failed: {exc}")
         return False
 
 
@@ -196,24 +352,19 @@ def download_audio_fallback(dest: str) -> bool:
     on the Internet Archive (different item).
     Returns True on success, False on failure.
     """
-    print("🎵  Trying fallback audio source …")
+    _say("🎵  Trying fallback audio source …")
     # 'Om Namah Shivaya' chant – public domain on Internet Archive
     fallback_url = (
         "https://archive.org/download/om-namah-shivaya-chant/"
         "om-namah-shivaya-chant.mp3"
     )
     try:
-        tmp = dest + ".tmp"
-        _download(fallback_url, tmp)
-        _validate_magic(tmp, "audio")
-        os.replace(tmp, dest)
-        print(f"   ✔  Saved: {dest}")
+        with _atomic_write(dest) as tmp:
+            _download(fallback_url, tmp, "audio")
+        _say(f"   ✔  Saved: {dest}")
         return True
     except Exception as exc:
-        print(f"   ⚠  Fallback audio failed: {exc}")
-        for p in [dest, dest + ".tmp"]:
-            if os.path.exists(p):
-                os.unlink(p)
+        _say(f"   ⚠  Fallback audio failed: {exc}")
         return False
 
 # ── Synthetic asset generation (ffmpeg, no network required) ──────────────────
@@ -235,7 +386,7 @@ def generate_synthetic_image(dest: str) -> None:
     Generate a 1920×1080 saffron-coloured placeholder JPEG using FFmpeg.
     No network access required.
     """
-    print("🎨  Generating synthetic placeholder image with FFmpeg …")
+    _say("🎨  Generating synthetic placeholder image with FFmpeg …")
     _run_ffmpeg([
         "-y", "-f", "lavfi",
         "-i", "color=c=0xFF7B00:size=1920x1080:rate=1",
@@ -244,7 +395,7 @@ def generate_synthetic_image(dest: str) -> None:
         dest,
     ])
     size_kb = os.path.getsize(dest) / 1024
-    print(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
+    _say(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
 
 
 def generate_synthetic_audio(dest: str, duration: int = 30) -> None:
@@ -252,7 +403,7 @@ def generate_synthetic_audio(dest: str, duration: int = 30) -> None:
     Generate a *duration*-second 432 Hz harmonic ambient tone as MP3 using FFmpeg.
     No network access required.
     """
-    print(f"🎹  Generating synthetic {duration}s ambient audio with FFmpeg …")
+    _say(f"🎹  Generating synthetic {duration}s ambient audio with FFmpeg …")
     # 432 Hz root + harmonic overtones (multiples/fractions of the base frequency)
     overtones = "+".join([
         "0.25*sin(2*PI*432*t)",
@@ -269,7 +420,71 @@ def generate_synthetic_audio(dest: str, duration: int = 30) -> None:
         dest,
     ])
     size_kb = os.path.getsize(dest) / 1024
-    print(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
+    _say(f"   ✔  Saved: {dest} ({size_kb:.0f} KB)")
+
+
+# ── Network mode ──────────────────────────────────────────────────────────────
+
+def _ensure_image() -> bool:
+    """
+    Make sure IMAGE_PATH exists, downloading it (or synthesizing a placeholder).
+    Returns False and prints instructions if no image could be obtained.
+    """
+    if os.path.isfile(IMAGE_PATH):
+        _say(f"📷  Image already present: {IMAGE_PATH}")
+        return True
+
+    ok = download_image(IMAGE_PATH)
+    if not ok:
+        _say("   ↩  Falling back to synthetic image …")
+        try:
+            generate_synthetic_image(IMAGE_PATH)
+            ok = True
+        except Exception as exc:
+            _say(f"   ⚠  Synthetic image generation failed: {exc}", file=sys.stderr)
+    if not ok:
+        _say(
+            "\n❌  Could not obtain an image.\n"
+            "   Please place any JPG/PNG image at:\n"
+            f"     {IMAGE_PATH}\n"
+            "   Free sources:\n"
+            "     • https://commons.wikimedia.org (search 'Radha Krishna painting')\n"
+            "     • https://pixabay.com/images/search/krishna/\n",
+            file=sys.stderr,
+        )
+    return ok
+
+
+def _ensure_audio() -> bool:
+    """
+    Make sure AUDIO_PATH exists, trying Internet Archive, the fallback item and
+    finally a synthesized tone.  Returns False and prints instructions on failure.
+    """
+    if os.path.isfile(AUDIO_PATH):
+        _say(f"🎵  Audio already present: {AUDIO_PATH}")
+        return True
+
+    ok = download_audio(AUDIO_PATH)
+    if not ok:
+        ok = download_audio_fallback(AUDIO_PATH)
+    if not ok:
+        _say("   ↩  Falling back to synthetic audio …")
+        try:
+            generate_synthetic_audio(AUDIO_PATH)
+            ok = True
+        except Exception as exc:
+            _say(f"   ⚠  Synthetic audio generation failed: {exc}", file=sys.stderr)
+    if not ok:
+        _say(
+            "\n❌  Could not obtain audio.\n"
+            "   Please place any MP3/WAV file at:\n"
+            f"     {AUDIO_PATH}\n"
+            "   Free sources:\n"
+            "     • https://pixabay.com/music/search/meditation/\n"
+            "     • https://freemusicarchive.org/search?q=meditation\n",
+            file=sys.stderr,
+        )
+    return ok
 
 
 # ── Main ──────────────────────────────────────────────────────────────────────
@@ -308,54 +523,20 @@ def main() -> None:
         print("      python pipeline.py")
         return
 
-    # ── Network mode ──────────────────────────────────────────────
-    if os.path.isfile(IMAGE_PATH):
-        print(f"📷  Image already present: {IMAGE_PATH}")
-    else:
-        ok = download_image(IMAGE_PATH)
-        if not ok:
-            print("   ↩  Falling back to synthetic image …")
-            try:
-                generate_synthetic_image(IMAGE_PATH)
-                ok = True
-            except Exception as exc:
-                print(f"   ⚠  Synthetic image generation failed: {exc}", file=sys.stderr)
-        if not ok:
-            print(
-                "\n❌  Could not obtain an image.\n"
-                "   Please place any JPG/PNG image at:\n"
-                f"     {IMAGE_PATH}\n"
-                "   Free sources:\n"
-                "     • https://commons.wikimedia.org (search 'Radha Krishna painting')\n"
-                "     • https://pixabay.com/images/search/krishna/\n",
-                file=sys.stderr,
-            )
-            sys.exit(1)
-
-    if os.path.isfile(AUDIO_PATH):
-        print(f"🎵  Audio already present: {AUDIO_PATH}")
-    else:
-        ok = download_audio(AUDIO_PATH)
-        if not ok:
-            ok = download_audio_fallback(AUDIO_PATH)
-        if not ok:
-            print("   ↩  Falling back to synthetic audio …")
-            try:
-                generate_synthetic_audio(AUDIO_PATH)
-                ok = True
-            except Exception as exc:
-                print(f"   ⚠  Synthetic audio generation failed: {exc}", file=sys.stderr)
-        if not ok:
-            print(
-                "\n❌  Could not obtain audio.\n"
-                "   Please place any MP3/WAV file at:\n"
-                f"     {AUDIO_PATH}\n"
-                "   Free sources:\n"
-                "     • https://pixabay.com/music/search/meditation/\n"
-                "     • https://freemusicarchive.org/search?q=meditation\n",
-                file=sys.stderr,
-            )
-            sys.exit(1)
+    # ── Network mode: image and audio download concurrently ──────
+    # Each worker runs its own metadata lookup (Wikimedia API / IA metadata)
+    # before its binary download, so the two JSON round trips already overlap
+    # and need no separate prefetch.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        jobs = [pool.submit(_run_worker, _ensure_image), pool.submit(_run_worker, _ensure_audio)]
+        ok = True
+        for job in jobs:
+            result, messages = job.result()
+            for file, line in messages:
+                print(line, file=file)
+            ok = ok and result
+    if not ok:
+        sys.exit(1)
 
     print("\n✅  All assets ready. Run the pipeline with:")
     print("      python pipeline.py")
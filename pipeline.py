@@ -6,6 +6,7 @@ using FFmpeg to produce a properly muxed MP4 video.
 
 Usage:
     python pipeline.py [--image PATH] [--audio PATH] [--output PATH]
+                       [--quality {hq,fast}] [--force] [--no-hwaccel]
 
 Defaults:
     --image  assets/images/radha_krishna.jpg
@@ -15,37 +16,68 @@ Defaults:
 The script auto-downloads placeholder assets if the default files are missing.
 Run `python download_assets.py` first to fetch free/open-licensed assets.
 
-Auto quality enhancements applied on every run:
+Auto quality enhancements (applied with the default --quality hq;
+--quality fast keeps only the scaling and fades for a quicker encode):
   - Warm golden colour grade (saturation +20 %, reds +8 %, blues -8 %, brightness +3 %)
   - Gentle sharpening        (unsharp 5×5 luma mask)
   - 2-second black fade-in and fade-out
-  - libx264 CRF 20 with fast preset  (high quality, smaller file than default)
-  - Scale to 1920×1080 with letterbox padding
+  - libx264 CRF 20 with fast preset, tuned for still images
+    (NVENC / VideoToolbox hardware encode when available; --no-hwaccel to disable)
+  - Scale to 1920×1080 with letterbox padding (pre-scaled once with Pillow when installed)
   - AAC 192 kbps audio
   - yuv420p for broad playback compatibility
 """
 
 import argparse
+import functools
+import hashlib
 import os
+import re
+import shutil
 import subprocess
 import sys
+from collections import deque
+from typing import Literal, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; FFmpeg scales the image instead
+    Image = None
 
 
 DEFAULT_IMAGE  = os.path.join("assets", "images", "radha_krishna.jpg")
 DEFAULT_AUDIO  = os.path.join("assets", "music",  "background.mp3")
 DEFAULT_OUTPUT = os.path.join("output", "final_video.mp4")
 
+FRAME_SIZE = (1920, 1080)
+
+# Constant parts of the -vf chain; only the fade-out start depends on the audio.
+# Letterbox to 1920×1080 (skipped when Pillow has already pre-scaled the image)
+_SCALE_VF = ",".join([
+    "scale=1920:1080:force_original_aspect_ratio=decrease",
+    "pad=1920:1080:(ow-iw)/2:(oh-ih)/2",
+])
+# Per-quality filters: "hq" adds the auto quality enhancements (sharpening,
+# warm colour grade); both presets get the 2-second fade-in.
+_QUALITY_VF = {
+    "hq": ",".join([
+        "unsharp=5:5:0.8:5:5:0.0",
+        "eq=brightness=0.03:saturation=1.2:gamma_r=1.08:gamma_b=0.92",
+        "fade=t=in:st=0:d=2",
+    ]),
+    "fast": "fade=t=in:st=0:d=2",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _find_tool(name: str) -> Optional[str]:
+    """Return the PATH location of executable *name*, or None.  Cached per process."""
+    return shutil.which(name)
+
 
 def check_ffmpeg() -> None:
     """Raise RuntimeError if ffmpeg is not available on PATH."""
-    try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
-    except FileNotFoundError:
+    if _find_tool("ffmpeg") is None:
         raise RuntimeError(
             "ffmpeg not found. Install it with:\n"
             "  Linux/macOS : sudo apt-get install -y ffmpeg  (or brew install ffmpeg)\n"
@@ -53,8 +85,163 @@ def check_ffmpeg() -> None:
         )
 
 
+# Hardware H.264 encoders tried in order.  Both use a constant-quality target
+# (like libx264 CRF 20) rather than a bitrate, and the same fixed 10 s GOP as
+# the libx264 settings below.  VideoToolbox -q:v needs Apple Silicon; where it
+# is unsupported the detection probe fails and libx264 is used instead.
+_HW_ENCODERS = {
+    "h264_nvenc":        ["-preset", "p4", "-rc", "vbr", "-cq", "20", "-b:v", "0", "-g", "250"],
+    "h264_videotoolbox": ["-q:v", "65", "-g", "250"],
+}
+
+# Software encode settings (libx264).  The looped still is pixel-identical
+# between the fades, so a fixed 10 s GOP with scene-cut detection off lets x264
+# emit near-empty P-frames instead of inserting extra keyframes.
+_X264_ARGS = [
+    "-crf", "20", "-tune", "stillimage",
+    "-x264-params", "keyint=250:min-keyint=250:scenecut=0",
+]
+_X264_PRESETS = {"hq": "fast", "fast": "veryfast"}
+
+
+@functools.lru_cache(maxsize=1)
+def detect_hw_encoder() -> Optional[str]:
+    """
+    Return the first hardware H.264 encoder that actually works here, or None.
+
+    An encoder listed by ``ffmpeg -encoders`` may still lack a usable device
+    (e.g. h264_nvenc without a GPU) or reject our settings, so each candidate
+    is confirmed with a one-frame test encode using the same options as the
+    real encode.  Cached per process.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-encoders"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    for encoder in _HW_ENCODERS:
+        if encoder not in result.stdout:
+            continue
+        probe = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-v", "error",
+             "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1",
+             "-frames:v", "1", "-c:v", encoder, *_HW_ENCODERS[encoder],
+             "-f", "null", "-"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        if probe.returncode == 0:
+            return encoder
+    return None
+
+
+# MPEG audio Layer III lookup tables (kbps / Hz), indexed by header fields.
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2 / 2.5
+}
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def _mp3_frame_header(buf: bytes, i: int) -> Optional[Tuple[int, int, int, int, bool]]:
+    """
+    Parse an MPEG Layer III frame header at ``buf[i]``.  Returns
+    ``(version, bitrate, sample_rate, frame_length, mono)`` or None if the four
+    bytes there are not a valid Layer III header.
+    """
+    if i + 4 > len(buf) or buf[i] != 0xFF or (buf[i + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = buf[i + 1], buf[i + 2], buf[i + 3]
+    version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_idx, rate_idx = b2 >> 4, (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[1 if mpeg1 else 2][bitrate_idx] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_idx]
+    frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+    return version, bitrate, sample_rate, frame_length, (b3 >> 6) == 3
+
+
+def _mp3_duration(audio_path: str) -> float:
+    """
+    Return the duration of an MP3 by reading its frame headers, or 0.0 if it
+    cannot be determined reliably (the caller then falls back to ffprobe).
+
+    Uses the Xing/Info or VBRI frame count when present; otherwise the file
+    must look CBR (the second frame has the first frame's bitrate) and the
+    duration is audio bytes / bitrate.
+    """
+    with open(audio_path, "rb") as fh:
+        head = fh.read(10)
+        offset = 0
+        if head[:3] == b"ID3" and len(head) == 10:
+            # Skip the ID3v2 tag: 28-bit syncsafe size, plus footer if flagged
+            offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+            if head[5] & 0x10:
+                offset += 10
+        fh.seek(offset)
+        buf = fh.read(8192)
+    file_size = os.path.getsize(audio_path)
+
+    # First frame sync that is followed by another valid frame header, so a
+    # stray 0xFFE bit pattern is not mistaken for the start of the audio.
+    for i in range(len(buf) - 4):
+        first = _mp3_frame_header(buf, i)
+        if first is None:
+            continue
+        second = _mp3_frame_header(buf, i + first[3])
+        if second is not None:
+            break
+    else:
+        return 0.0
+
+    version, bitrate, sample_rate, _, mono = first
+    mpeg1 = version == 3
+    samples_per_frame = 1152 if mpeg1 else 576
+
+    # Xing/Info header sits right after the side information of the first frame
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = i + 4 + side_info
+    if buf[xing:xing + 4] in (b"Xing", b"Info"):
+        if not buf[xing + 7] & 0x01:
+            return 0.0  # no frame count
+        frames = int.from_bytes(buf[xing + 8:xing + 12], "big")
+        return frames * samples_per_frame / sample_rate
+
+    # Fraunhofer VBRI header sits at a fixed 32 bytes after the frame header
+    vbri = i + 36
+    if buf[vbri:vbri + 4] == b"VBRI":
+        frames = int.from_bytes(buf[vbri + 14:vbri + 18], "big")
+        return frames * samples_per_frame / sample_rate
+
+    # No VBR header: only trust bytes / bitrate if the stream looks CBR
+    if second[1] != bitrate:
+        return 0.0
+    return (file_size - offset - i) * 8 / bitrate
+
+
 def get_audio_duration(audio_path: str) -> float:
-    """Return the audio duration in seconds using ffprobe, or 0.0 on failure."""
+    """
+    Return the audio duration in seconds, or 0.0 on failure.
+    MP3 files are measured in-process from the frame header; other formats
+    (or unparseable MP3s) fall back to ffprobe.
+    """
+    if audio_path.lower().endswith(".mp3"):
+        try:
+            duration = _mp3_duration(audio_path)
+        except (OSError, IndexError):
+            duration = 0.0
+        if duration > 0:
+            return duration
+
+    if _find_tool("ffprobe") is None:
+        return 0.0
     result = subprocess.run(
         ["ffprobe", "-v", "quiet", "-show_entries", "format=duration",
          "-of", "csv=p=0", audio_path],
@@ -68,63 +255,207 @@ def get_audio_duration(audio_path: str) -> float:
         return 0.0
 
 
-def generate_video(image_path: str, audio_path: str, output_path: str) -> None:
+def _file_digest(path: str) -> bytes:
+    """Return the blake2b digest of the file at *path*, streamed in 1 MiB blocks."""
+    h = hashlib.blake2b()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+# Files generate_video keeps in .cache/: encodes (<key>[.partial].<ext>) and
+# pre-scaled stills (<hash>.1080p.png)
+_CACHE_ENTRY = re.compile(r"^(?:[0-9a-f]{32}(?:\.partial)?\.\w+|[0-9a-f]{16}\.1080p\.png)$")
+
+
+def _prune_cache(cache_dir: str, keep: set) -> None:
+    """Delete cache entries in *cache_dir* other than the paths in *keep*."""
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if _CACHE_ENTRY.match(name) and path not in keep:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # pruning is best-effort
+
+
+def _run_encode(cmd: list) -> Tuple[int, str]:
+    """
+    Run an FFmpeg encode and return ``(exit code, last stderr lines)``.
+
+    stderr is drained as it is produced and only the tail is kept, so a long
+    encode neither fills the pipe nor buffers its whole log.
+    """
+    stderr_tail: deque = deque(maxlen=40)
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    ) as proc:
+        for line in proc.stderr:
+            stderr_tail.append(line)
+    return proc.returncode, "".join(stderr_tail)
+
+
+def prescale_image(image_path: str, cache_dir: str) -> Optional[str]:
+    """
+    Letterbox *image_path* to 1920×1080 once with Pillow and return the PNG path.
+
+    The looped still would otherwise be scaled and padded by FFmpeg on every
+    output frame.  The result is stored in *cache_dir*, named after a hash of
+    the source contents, so reruns skip Pillow too.  Returns None when Pillow
+    is not installed or the image cannot be processed (FFmpeg then scales).
+    """
+    if Image is None:
+        return None
+    try:
+        digest = _file_digest(image_path).hex()[:16]
+        prescaled = os.path.join(cache_dir, f"{digest}.1080p.png")
+        if os.path.isfile(prescaled):
+            return prescaled
+        os.makedirs(cache_dir, exist_ok=True)
+
+        with Image.open(image_path) as img:
+            canvas = ImageOps.pad(
+                img.convert("RGB"), FRAME_SIZE, method=Image.LANCZOS, color=(0, 0, 0)
+            )
+        tmp = prescaled + ".tmp"
+        canvas.save(tmp, format="PNG", compress_level=1)
+        os.replace(tmp, prescaled)
+        return prescaled
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        print(f"   ⚠  Pre-scaling skipped ({exc}); FFmpeg will scale the image.")
+        return None
+
+
+def generate_video(
+    image_path: str,
+    audio_path: str,
+    output_path: str,
+    hwaccel: bool = True,
+    use_cache: bool = True,
+    quality: Literal["fast", "hq"] = "hq",
+) -> None:
     """
     Combine *image_path* and *audio_path* into a high-quality MP4 at *output_path*.
 
-    Auto quality enhancements:
+    Auto quality enhancements (*quality* "hq", the default):
       - Warm golden colour grade  (saturation +20 %, reds +8 %, blues -8 %, brightness +3 %)
       - Gentle sharpening         (unsharp 5×5 luma mask)
       - 2-second black fade-in and fade-out
-      - libx264 CRF 20 with fast preset  → high quality, compact file
+      - libx264 CRF 20 with fast preset, -tune stillimage  → high quality, compact file
       - Scale to 1920×1080 with letterbox padding
       - AAC audio at 192 kbps
       - yuv420p pixel format for broad playback compatibility
       - -shortest  → video length equals the audio duration
+
+    *quality* "fast" skips the sharpening and colour grade and uses the
+    veryfast x264 preset, keeping the scaling, fades and audio settings.
+
+    With *hwaccel* (default) the encode is offloaded to NVENC / VideoToolbox
+    when a working hardware encoder is detected; libx264 is used otherwise.
+    The filters themselves always run on the CPU.
+
+    The latest encode is cached in ``.cache/`` beside *output_path*, keyed by a
+    hash of both inputs and the encode settings; an unchanged rerun copies the
+    cached video into place instead of re-encoding, and a new encode replaces
+    the previous entry.  The cache is local to this checkout (CI runs start
+    without it).  Pass *use_cache=False* to force a re-encode.
     """
     os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
 
     fps = 25
     duration = get_audio_duration(audio_path)
 
-    vf_parts = [
-        "scale=1920:1080:force_original_aspect_ratio=decrease",
-        "pad=1920:1080:(ow-iw)/2:(oh-ih)/2",
-        f"fps={fps}",
-        # Auto quality enhancements
-        "unsharp=5:5:0.8:5:5:0.0",
-        "eq=brightness=0.03:saturation=1.2:gamma_r=1.08:gamma_b=0.92",
-        "fade=t=in:st=0:d=2",
-    ]
+    cache_dir = os.path.join(os.path.dirname(output_path) or ".", ".cache")
+    prescaled = prescale_image(image_path, cache_dir)
+    vf = _QUALITY_VF[quality] if prescaled else f"{_SCALE_VF},{_QUALITY_VF[quality]}"
     if duration > 4:
-        vf_parts.append(f"fade=t=out:st={duration - 2:.1f}:d=2")
-    vf = ",".join(vf_parts)
+        vf += f",fade=t=out:st={duration - 2:.1f}:d=2"
 
-    cmd = [
-        "ffmpeg", "-y",
-        "-loop", "1", "-i", image_path,
-        "-i", audio_path,
-        "-c:v", "libx264", "-crf", "20", "-preset", "fast",
+    x264_codec = ["-c:v", "libx264", "-preset", _X264_PRESETS[quality]] + _X264_ARGS
+    common_args = [
         "-c:a", "aac", "-b:a", "192k",
         "-vf", vf,
         "-pix_fmt", "yuv420p",
         "-shortest",
-        output_path,
     ]
 
-    print("▶  Running FFmpeg with quality enhancements …")
-    print("   Filters: warm colour grade · sharpening · fade in/out")
+    # Content-addressed cache: same inputs + same settings → same video.
+    # The key records whether hardware encoding was allowed rather than which
+    # encoder was detected, so a cache hit never has to probe for one.
+    # The output extension picks FFmpeg's muxer, so it is part of the key too.
+    ext = os.path.splitext(output_path)[1] or ".mp4"
+    settings = [ext, str(fps)] + x264_codec + common_args
+    if hwaccel:
+        settings.append(f"hwaccel={_HW_ENCODERS}")
+    key = hashlib.blake2b(digest_size=16)
+    key.update(_file_digest(image_path))
+    key.update(_file_digest(audio_path))
+    key.update(" ".join(settings).encode())
+    cached = os.path.join(cache_dir, key.hexdigest() + ext)
+    if use_cache and os.path.isfile(cached):
+        shutil.copyfile(cached, output_path)
+        print(f"♻️   Inputs and settings unchanged – reusing cached encode: {cached}")
+        print(f"\n✅  Video saved: {output_path}")
+        return
+
+    encoder = detect_hw_encoder() if hwaccel else None
+    if encoder:
+        video_codec = ["-c:v", encoder] + _HW_ENCODERS[encoder]
+    else:
+        video_codec = x264_codec
+
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = os.path.join(cache_dir, key.hexdigest() + ".partial" + ext)
+    input_args = [
+        "ffmpeg", "-y",
+        "-loop", "1", "-framerate", str(fps), "-i", prescaled or image_path,
+        "-i", audio_path,
+    ]
+    cmd = input_args + video_codec + common_args + [partial]
+
+    if quality == "hq":
+        print("▶  Running FFmpeg with quality enhancements …")
+        print("   Filters: warm colour grade · sharpening · fade in/out")
+    else:
+        print("▶  Running FFmpeg (fast preset) …")
+        print("   Filters: fade in/out")
+    print(f"   Encoder: {encoder or 'libx264'}")
     print("   " + " ".join(cmd))
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    returncode, stderr_tail = _run_encode(cmd)
 
-    if result.returncode != 0:
-        stderr_tail = result.stderr[-2000:] if result.stderr else "(no output)"
+    if returncode != 0 and encoder:
+        # The hardware encoder passed the probe but failed the real encode
+        # (e.g. NVENC session limit) – retry once in software.
         print(stderr_tail, file=sys.stderr)
-        raise RuntimeError(f"FFmpeg failed (exit code {result.returncode})")
+        print(f"   ⚠  {encoder} encode failed (exit code {returncode}); retrying with libx264 …")
+        encoder = None
+        cmd = input_args + x264_codec + common_args + [partial]
+        print("   " + " ".join(cmd))
+        returncode, stderr_tail = _run_encode(cmd)
+
+    if returncode != 0:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        print(stderr_tail or "(no output)", file=sys.stderr)
+        raise RuntimeError(f"FFmpeg failed (exit code {returncode})")
+
+    # The cache entry is only ever written by this rename; the output is a
+    # separate copy, so later edits to it cannot alter the cached encode.
+    os.replace(partial, cached)
+    shutil.copyfile(cached, output_path)
+    # Keep only the latest encode (and its still) so the cache stays bounded
+    _prune_cache(cache_dir, {cached, prescaled})
 
     size_mb = os.path.getsize(output_path) / (1024 * 1024)
     print(f"\n✅  Video saved: {output_path} ({size_mb:.1f} MB)")
-    print("   Quality: 1920×1080 | CRF 20 | AAC 192k | Warm grade | Sharpened | Fade in/out")
+    video_desc = encoder or "CRF 20"
+    extras = "Warm grade | Sharpened | " if quality == "hq" else ""
+    print(f"   Quality: 1920×1080 | {video_desc} | AAC 192k | {extras}Fade in/out")
 
 
 def parse_args() -> argparse.Namespace:
@@ -137,6 +468,12 @@ def parse_args() -> argparse.Namespace:
                         help=f"Input audio (default: {DEFAULT_AUDIO})")
     parser.add_argument("--output", default=DEFAULT_OUTPUT,
                         help=f"Output video path (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--quality", choices=["hq", "fast"], default="hq",
+                        help="hq: sharpening + colour grade (default); fast: fades only, quicker encode")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-encode even if a cached video for these inputs exists")
+    parser.add_argument("--no-hwaccel", dest="hwaccel", action="store_false",
+                        help="Always encode with libx264, even if a hardware encoder is available")
     return parser.parse_args()
 
 
@@ -155,7 +492,8 @@ def main() -> None:
             sys.exit(1)
 
     check_ffmpeg()
-    generate_video(args.image, args.audio, args.output)
+    generate_video(args.image, args.audio, args.output, hwaccel=args.hwaccel,
+                   use_cache=not args.force, quality=args.quality)
 
 
 if __name__ == "__main__":
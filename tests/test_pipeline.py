@@ -0,0 +1,81 @@
+"""
+Tests for the in-process MP3 duration reader in pipeline.py.
+
+The MP3 files are built from synthetic MPEG-1 Layer III frames (44.1 kHz,
+stereo), so no encoder or sample audio is needed.
+"""
+
+import pytest
+
+from pipeline import _mp3_duration
+
+SAMPLE_RATE = 44100
+SAMPLES_PER_FRAME = 1152
+# MPEG-1 Layer III bitrate table indices
+BITRATE_IDX = {128: 9, 160: 10}
+
+
+def _frame(kbps: int, payload: bytes = b"") -> bytes:
+    """One MPEG-1 Layer III frame (no CRC, no padding) with *payload* after the side info."""
+    header = bytes([0xFF, 0xFB, BITRATE_IDX[kbps] << 4, 0x00])
+    length = 144 * kbps * 1000 // SAMPLE_RATE
+    body = bytes(32) + payload  # stereo side information, then the payload
+    return (header + body).ljust(length, b"\x00")
+
+
+def _id3v2(size: int) -> bytes:
+    """An ID3v2.4 tag with *size* bytes of (zeroed) frames and a syncsafe size field."""
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def _write(tmp_path, data: bytes) -> str:
+    path = tmp_path / "track.mp3"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_cbr_duration_from_bitrate(tmp_path):
+    frames = 200
+    path = _write(tmp_path, _frame(128) * frames)
+    expected = frames * len(_frame(128)) * 8 / 128000
+    assert _mp3_duration(path) == pytest.approx(expected)
+
+
+def test_id3v2_tag_is_skipped(tmp_path):
+    frames = 200
+    path = _write(tmp_path, _id3v2(300) + _frame(128) * frames)
+    expected = frames * len(_frame(128)) * 8 / 128000
+    assert _mp3_duration(path) == pytest.approx(expected)
+
+
+def test_xing_frame_count(tmp_path):
+    # Xing tag claims 1000 frames although only a few follow (as in a real VBR file)
+    xing = b"Xing" + (1).to_bytes(4, "big") + (1000).to_bytes(4, "big")
+    path = _write(tmp_path, _frame(128, xing) + _frame(160) * 5)
+    assert _mp3_duration(path) == pytest.approx(1000 * SAMPLES_PER_FRAME / SAMPLE_RATE)
+
+
+def test_vbri_frame_count(tmp_path):
+    vbri = b"VBRI" + bytes(10) + (500).to_bytes(4, "big")
+    path = _write(tmp_path, _frame(128, vbri) + _frame(160) * 5)
+    assert _mp3_duration(path) == pytest.approx(500 * SAMPLES_PER_FRAME / SAMPLE_RATE)
+
+
+def test_false_sync_before_audio_is_ignored(tmp_path):
+    junk = b"\xff\xfb\x90\x00" + bytes(6)
+    frames = 200
+    path = _write(tmp_path, junk + _frame(128) * frames)
+    expected = frames * len(_frame(128)) * 8 / 128000
+    assert _mp3_duration(path) == pytest.approx(expected)
+
+
+def test_vbr_without_header_defers_to_ffprobe(tmp_path):
+    path = _write(tmp_path, (_frame(128) + _frame(160)) * 50)
+    assert _mp3_duration(path) == 0.0
+
+
+def test_xing_without_frame_count_defers_to_ffprobe(tmp_path):
+    xing = b"Xing" + (0).to_bytes(4, "big")
+    path = _write(tmp_path, _frame(128, xing) + _frame(128) * 5)
+    assert _mp3_duration(path) == 0.0